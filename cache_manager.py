@@ -2,12 +2,41 @@
 Cache manager for Wikipedia quiz generation.
 Handles checking for existing quizzes and preventing duplicate scraping.
 """
-import json
-from typing import Optional
+import threading
+from typing import Dict, List, Optional
+import zstandard as zstd
+from cachetools import TTLCache
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from database import Quiz
+from fast_json import dumpb, loads
 from datetime import datetime, timedelta
 
+# Decoded quiz payloads for hot URLs, so repeat hits skip the DB and JSON parsing.
+# TTLCache isn't thread-safe and lookups run in FastAPI's threadpool, hence the lock.
+_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=600)
+_CACHE_LOCK = threading.Lock()
+
+# zstd (de)compressor objects must not be shared between threads, and the
+# endpoints call into here from FastAPI's threadpool
+_zstd = threading.local()
+
+
+def encode_quiz_data(data: dict) -> bytes:
+    """Serialize quiz data to zstd-compressed JSON for the full_quiz_data column."""
+    cctx = getattr(_zstd, "cctx", None)
+    if cctx is None:
+        cctx = _zstd.cctx = zstd.ZstdCompressor(level=6)
+    return cctx.compress(dumpb(data))
+
+
+def decode_quiz_data(blob: bytes) -> dict:
+    """Inverse of encode_quiz_data."""
+    dctx = getattr(_zstd, "dctx", None)
+    if dctx is None:
+        dctx = _zstd.dctx = zstd.ZstdDecompressor()
+    return loads(dctx.decompress(blob))
+
 
 def check_cache(db: Session, url: str) -> Optional[dict]:
     """
@@ -21,18 +50,70 @@ def check_cache(db: Session, url: str) -> Optional[dict]:
         Quiz data dict if found, None otherwise
     """
     url = url.strip()
-    quiz = db.query(Quiz).filter(Quiz.url == url).first()
+    with _CACHE_LOCK:
+        data = _CACHE.get(url)
+    if data is not None:
+        return dict(data)
+
+    quiz = db.execute(
+        select(Quiz.id, Quiz.full_quiz_data, Quiz.date_generated).where(Quiz.url == url)
+    ).first()
     
     if quiz:
-        data = json.loads(quiz.full_quiz_data)
-        data["id"] = quiz.id
-        data["cached"] = True
-        data["date_generated"] = quiz.date_generated.isoformat()
-        return data
+        data = _cached_payload(quiz)
+        with _CACHE_LOCK:
+            _CACHE[url] = data
+        return dict(data)
     
     return None
 
 
+def check_cache_many(db: Session, urls: List[str]) -> Dict[str, dict]:
+    """
+    Batch version of check_cache using a single SELECT ... WHERE url IN (...).
+    
+    Args:
+        db: Database session
+        urls: Wikipedia article URLs
+        
+    Returns:
+        Mapping of URL to quiz data dict for the URLs that are already cached
+    """
+    urls = [u.strip() for u in urls]
+    found = {}
+    with _CACHE_LOCK:
+        for url in urls:
+            data = _CACHE.get(url)
+            if data is not None:
+                found[url] = dict(data)
+    missing = [u for u in urls if u not in found]
+    if not missing:
+        return found
+
+    rows = db.execute(
+        select(Quiz.id, Quiz.url, Quiz.full_quiz_data, Quiz.date_generated).where(Quiz.url.in_(missing))
+    ).all()
+    loaded = {row.url: _cached_payload(row) for row in rows}
+    with _CACHE_LOCK:
+        _CACHE.update(loaded)
+    found.update((url, dict(data)) for url, data in loaded.items())
+    return found
+
+
+def invalidate_cache(url: str) -> None:
+    """Drop a URL from the in-process quiz cache."""
+    with _CACHE_LOCK:
+        _CACHE.pop(url.strip(), None)
+
+
+def _cached_payload(row) -> dict:
+    data = decode_quiz_data(row.full_quiz_data)
+    data["id"] = row.id
+    data["cached"] = True
+    data["date_generated"] = row.date_generated.isoformat()
+    return data
+
+
 def get_cache_stats(db: Session) -> dict:
     """
     Get cache statistics.
@@ -43,10 +124,13 @@ def get_cache_stats(db: Session) -> dict:
     Returns:
         Dictionary with cache statistics
     """
-    total_quizzes = db.query(Quiz).count()
-    recent_quizzes = db.query(Quiz).filter(
-        Quiz.date_generated >= datetime.utcnow() - timedelta(days=7)
-    ).count()
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    total_quizzes, recent_quizzes = db.execute(
+        select(
+            func.count(Quiz.id),
+            func.count(Quiz.id).filter(Quiz.date_generated >= week_ago),
+        )
+    ).one()
     
     return {
         "total_cached": total_quizzes,
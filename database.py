@@ -1,8 +1,10 @@
 import os
-from typing import Optional
+from typing import Iterator, Optional
 from sqlalchemy import create_engine, UniqueConstraint
-from sqlalchemy.orm import sessionmaker, DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Integer, String, DateTime, Text
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, Mapped, mapped_column, Session
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import Integer, String, DateTime, Text, LargeBinary
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -11,8 +13,23 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set. Please define it in .env")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+if DATABASE_URL.startswith("sqlite"):
+    # Local development: one shared connection usable from FastAPI's worker threads
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+else:
+    # Size the pool for concurrent requests per worker (defaults: 20 + 40 overflow)
+    engine = create_engine(
+        DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+        pool_recycle=1800,
+    )
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 class Base(DeclarativeBase):
     pass
@@ -22,13 +39,25 @@ class Quiz(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     url: Mapped[str] = mapped_column(String(1024), nullable=False, unique=True, index=True)
     title: Mapped[str] = mapped_column(String(512), nullable=False)
-    date_generated: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    date_generated: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     scraped_content: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    raw_html: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Store raw HTML for reference
-    full_quiz_data: Mapped[str] = mapped_column(Text, nullable=False)
+    full_quiz_data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)  # zstd-compressed JSON
+
+def insert_quiz_skip_duplicates():
+    """INSERT into quizzes that skips rows whose URL already exists (ON CONFLICT DO NOTHING)."""
+    dialect = sqlite if engine.dialect.name == "sqlite" else postgresql
+    return dialect.insert(Quiz).on_conflict_do_nothing(index_elements=["url"])
 
 def init_db():
     """Initialize database tables. Creates tables if they don't exist."""
     Base.metadata.create_all(bind=engine)
 
+def get_db() -> Iterator[Session]:
+    """FastAPI dependency yielding a session that is always closed after the request."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 
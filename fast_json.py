@@ -0,0 +1,27 @@
+"""
+Thin JSON shim for the quiz payload hot paths.
+Uses orjson when it is installed and falls back to the stdlib otherwise.
+"""
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumpb(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+else:
+    import json
+
+    loads = json.loads
+
+    def dumpb(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
@@ -1,9 +1,11 @@
 import os
-import json
-from typing import Any, List, Tuple, Union
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple, Type, Union
 from dotenv import load_dotenv
 import google.generativeai as genai
-from models import QuizOutput
+import msgspec
+from models import QuizBatchOutput, QuizOutput
 
 load_dotenv()
 
@@ -13,11 +15,10 @@ if not API_KEY:
 
 genai.configure(api_key=API_KEY)
 
-PROMPT_TEMPLATE = """You are an expert educational content generator specializing in creating high-quality quizzes from Wikipedia articles.
-
-Your task is to analyze the provided Wikipedia article and generate a comprehensive quiz package.
+_PROMPT_INTRO = """You are an expert educational content generator specializing in creating high-quality quizzes from Wikipedia articles.
+"""
 
-CRITICAL RULES:
+_PROMPT_RULES = """CRITICAL RULES:
 1. Use ONLY facts explicitly stated in the article text - NO external knowledge or assumptions
 2. Questions must be directly answerable from the article content
 3. All four options must be plausible to avoid obvious answers
@@ -39,46 +40,109 @@ TASKS:
    - Difficulty: easy (basic facts), medium (requires understanding), hard (detailed knowledge)
    - Explanation: Brief reason citing article section or context
 5. **Related Topics**: Suggest 3-5 related Wikipedia topics for further reading
+"""
 
-JSON SCHEMA (return ONLY this, nothing else):
-{{
-  "url": "{url}",
-  "title": "{title}",
+# Templates below are filled with str.replace on these NUL-delimited markers rather than
+# str.format, so the JSON braces need no escaping and no format spec is parsed per call.
+# The article text is always substituted last so its content is never scanned for markers.
+_URL = "\x00URL\x00"
+_TITLE = "\x00TITLE\x00"
+_TEXT = "\x00TEXT\x00"
+_COUNT = "\x00COUNT\x00"
+_INDEX = "\x00INDEX\x00"
+
+# Shared by the single and batch prompts
+_QUIZ_SCHEMA = """{
+  "url": "\x00URL\x00",
+  "title": "\x00TITLE\x00",
   "summary": "string (2-3 sentences)",
-  "key_entities": {{
+  "key_entities": {
     "people": ["string"],
     "organizations": ["string"],
     "locations": ["string"]
-  }},
+  },
   "sections": ["string"],
   "quiz": [
-    {{
+    {
       "question": "string",
       "options": ["string", "string", "string", "string"],
       "answer": "string (must match one option exactly)",
       "difficulty": "easy" | "medium" | "hard",
       "explanation": "string (reference article section/context)"
-    }}
+    }
   ],
   "related_topics": ["string"]
-}}
+}"""
+
+PROMPT_TEMPLATE = _PROMPT_INTRO + """
+Your task is to analyze the provided Wikipedia article and generate a comprehensive quiz package.
+
+""" + _PROMPT_RULES + """
+JSON SCHEMA (return ONLY this, nothing else):
+""" + _QUIZ_SCHEMA + """
 
 ARTICLE DATA:
-URL: {url}
-TITLE: {title}
+URL: \x00URL\x00
+TITLE: \x00TITLE\x00
 
 ARTICLE TEXT:
-{article_text}
+\x00TEXT\x00
 
 Generate the quiz now. Return ONLY valid JSON, no other text.
 """
 
+BATCH_PROMPT_TEMPLATE = _PROMPT_INTRO + """
+Your task is to analyze each of the \x00COUNT\x00 Wikipedia articles below independently and generate a comprehensive quiz package for every one of them.
+Apply the rules to each article separately, using only that article's text.
+
+""" + _PROMPT_RULES + """
+JSON SCHEMA (return ONLY this, nothing else):
+{
+  "quizzes": [QUIZ, ...]
+}
+
+"quizzes" must contain exactly one QUIZ per article, in the same order as the articles, where each QUIZ is:
+""" + _QUIZ_SCHEMA.replace(_URL, "string (copy the article URL exactly)").replace(
+    _TITLE, "string (the article title)"
+) + """
+
+\x00TEXT\x00
+Generate the \x00COUNT\x00 quizzes now. Return ONLY valid JSON, no other text.
+"""
+
+_BATCH_ARTICLE_BLOCK = """ARTICLE \x00INDEX\x00 DATA:
+URL: \x00URL\x00
+TITLE: \x00TITLE\x00
+
+ARTICLE \x00INDEX\x00 TEXT:
+\x00TEXT\x00
+"""
+
+# Each quiz costs a few thousand output tokens; keep a batch within the model's output limit
+MAX_BATCH_SIZE = 3
+
+# JSON mode keeps the model from emitting prose / markdown fences, and generation time grows
+# with output length, so cap it. The schema is described in the prompt and enforced by msgspec.
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "max_output_tokens": 3072,
+    "temperature": 0.3,
+}
+# Upper bound for a whole batch response
+MAX_BATCH_OUTPUT_TOKENS = 8192
+
+# Input budget for each article's text, estimated at ~4 characters per token
+ARTICLE_TOKEN_BUDGET = 4096
+_CHARS_PER_TOKEN = 4
 
+
+@lru_cache(maxsize=1)
 def _pick_model() -> str:
     """
     Detect available models on this API key and pick a good one that supports generateContent.
     Preference: gemini-1.5-flash > gemini-1.5-flash-8b > any 'flash' > any generateContent-capable model.
     Allows override with GEMINI_MODEL env if it exists and is supported.
+    The result is cached for the life of the process; failures are not cached and retry on the next call.
     """
     models = list(genai.list_models())
     gen_models = [m for m in models if "generateContent" in getattr(m, "supported_generation_methods", [])]
@@ -109,55 +173,120 @@ def _pick_model() -> str:
             return f"models/{s}"
     return names[0]
 
-def _clean_json_text(text: str) -> str:
-    text = (text or "").strip()
-    if not text:
-        return text
-    if text.startswith("```"):
-        text = text.strip().strip("`")
-        if text.startswith("json"):
-            text = text[4:].lstrip()
-    if text and not (text.strip().startswith("{") and text.strip().endswith("}")):
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            text = text[start : end + 1]
-    return text
-
-def _try_once(model_name: str, prompt: str) -> Tuple[bool, Union[dict, str]]:
+@lru_cache(maxsize=1)
+def _get_model() -> genai.GenerativeModel:
+    """Shared GenerativeModel for the picked model, built once per process."""
+    return genai.GenerativeModel(_pick_model(), generation_config=GENERATION_CONFIG)
+
+# Only these characters change the scanner state in _extract_json_object
+_JSON_SIGNIFICANT = re.compile(r'[{}"\\]')
+
+def _extract_json_object(text: str) -> str:
+    """
+    Return the first balanced {...} object in text in a single left-to-right scan.
+    Prose or markdown fences around the object are skipped, and braces inside
+    string literals are ignored. An unterminated object is returned as-is so the
+    JSON parser reports the real error.
+    """
+    start = text.find("{")
+    if start == -1:
+        return ""
+    depth = 0
+    in_string = False
+    escaped_at = -1
+    for m in _JSON_SIGNIFICANT.finditer(text, start):
+        i = m.start()
+        if i == escaped_at:
+            continue
+        ch = m.group()
+        if in_string:
+            if ch == "\\":
+                escaped_at = i + 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return text[start:]
+
+def _try_once(
+    prompt: str, schema: Type[msgspec.Struct] = QuizOutput, generation_config: Optional[dict] = None
+) -> Tuple[bool, Union[dict, str]]:
     try:
-        model = genai.GenerativeModel(model_name)
-        resp = model.generate_content(prompt)
-        text = _clean_json_text(getattr(resp, "text", "") or "")
+        resp = _get_model().generate_content(prompt, generation_config=generation_config)
+        text = _extract_json_object(getattr(resp, "text", "") or "")
         if not text:
             return False, "Empty model response"
 
-        data = json.loads(text)
-        QuizOutput.model_validate(data)
-        for q in data.get("quiz", []):
-            if isinstance(q.get("difficulty"), str):
-                q["difficulty"] = q["difficulty"].lower()
-        QuizOutput.model_validate(data)
-        return True, data
+        # Parse and validate in one native pass, then hand back plain dicts/lists
+        return True, msgspec.to_builtins(msgspec.json.decode(text, type=schema))
     except Exception as e:
         return False, f"{type(e).__name__}: {e}"
 
+def _trim_article(text: str, max_tokens: int = ARTICLE_TOKEN_BUDGET) -> str:
+    """
+    Trim article text to roughly max_tokens, cutting after the last whole paragraph that fits
+    (the scraper separates paragraphs with blank lines) rather than mid-sentence.
+    """
+    text = text or ""
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n\n", 0, max_chars + 1)
+    if cut <= 0:
+        # The first paragraph alone is over budget; end at its last full sentence instead
+        cut = text.rfind(". ", 0, max_chars) + 1 or max_chars
+    return text[:cut]
+
 def generate_quiz(url: str, title: str, article_text: str) -> dict[str, Any]:
-    article_text = (article_text or "")[:18000]
-    prompt = PROMPT_TEMPLATE.format(url=url, title=title, article_text=article_text)
-
-    model_name = _pick_model()
-    ok, result = _try_once(model_name, prompt)
-    if ok:
-        result["url"] = url
-        result["title"] = result.get("title") or title
-        return result
-
-    nudge_prompt = prompt + "\n\nREMINDER: Return ONLY pure JSON that exactly matches the schema. No markdown."
-    ok2, result2 = _try_once(model_name, nudge_prompt)
-    if ok2:
-        result2["url"] = url
-        result2["title"] = result2.get("title") or title
-        return result2
-
-    raise RuntimeError(f"Model {model_name} failed. Last error: {result2 if not ok2 else result}")
+    article_text = _trim_article(article_text)
+    prompt = PROMPT_TEMPLATE.replace(_URL, url).replace(_TITLE, title).replace(_TEXT, article_text)
+
+    ok, result = _try_once(prompt)
+    if not ok:
+        raise RuntimeError(f"Model {_pick_model()} failed. Last error: {result}")
+
+    result["url"] = url
+    result["title"] = result.get("title") or title
+    return result
+
+
+def generate_quiz_batch(items: List[Tuple[str, str, str]]) -> List[dict[str, Any]]:
+    """
+    Generate quizzes for several articles with a single model call.
+
+    Args:
+        items: (url, title, article_text) tuples, at most MAX_BATCH_SIZE of them
+
+    Returns:
+        One quiz dict per item, in the same order
+    """
+    articles = "\n".join(
+        _BATCH_ARTICLE_BLOCK.replace(_INDEX, str(i))
+        .replace(_URL, url)
+        .replace(_TITLE, title)
+        .replace(_TEXT, _trim_article(article_text))
+        for i, (url, title, article_text) in enumerate(items, start=1)
+    )
+    prompt = BATCH_PROMPT_TEMPLATE.replace(_COUNT, str(len(items))).replace(_TEXT, articles)
+
+    generation_config = {
+        **GENERATION_CONFIG,
+        "max_output_tokens": min(GENERATION_CONFIG["max_output_tokens"] * len(items), MAX_BATCH_OUTPUT_TOKENS),
+    }
+    ok, result = _try_once(prompt, QuizBatchOutput, generation_config)
+    if not ok:
+        raise RuntimeError(f"Model {_pick_model()} failed. Last error: {result}")
+
+    quizzes = result["quizzes"]
+    if len(quizzes) != len(items):
+        raise RuntimeError(f"Model {_pick_model()} returned {len(quizzes)} quizzes for {len(items)} articles")
+    for quiz, (url, title, _) in zip(quizzes, items):
+        quiz["url"] = url
+        quiz["title"] = quiz.get("title") or title
+    return quizzes
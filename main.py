@@ -1,14 +1,25 @@
-import json
-from fastapi import FastAPI, HTTPException
+import asyncio
+from typing import Dict, List, Tuple
+
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from requests import HTTPError
-from sqlalchemy.exc import IntegrityError
+from httpx import HTTPStatusError
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 
-from database import SessionLocal, init_db, Quiz
-from scraper import scrape_wikipedia
-from llm_quiz_generator import generate_quiz
-from cache_manager import check_cache, get_cache_stats
+from database import get_db, init_db, insert_quiz_skip_duplicates, Quiz
+from scraper import close_clients, fetch_wikipedia_title, scrape_wikipedia
+from llm_quiz_generator import MAX_BATCH_SIZE, generate_quiz, generate_quiz_batch
+from cache_manager import (
+    check_cache,
+    check_cache_many,
+    get_cache_stats,
+    encode_quiz_data,
+    decode_quiz_data,
+    invalidate_cache,
+)
 
 app = FastAPI(title="AI Wiki Quiz Generator API")
 
@@ -25,23 +36,32 @@ class GenerateBody(BaseModel):
     url: str
 
 
+class BatchBody(BaseModel):
+    urls: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
 @app.on_event("startup")
 def on_startup():
     init_db()
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_clients()
+
+
 @app.get("/")
 def root():
     """API root endpoint with basic information."""
     return {
         "name": "AI Wiki Quiz Generator API",
         "version": "1.0.0",
-        "endpoints": ["/generate_quiz", "/history", "/quiz/{id}", "/preview", "/cache/stats"]
+        "endpoints": ["/generate_quiz", "/generate_quiz_batch", "/history", "/quiz/{id}", "/preview", "/cache/stats"]
     }
 
 
 @app.post("/preview")
-def preview_url(body: GenerateBody):
+async def preview_url(body: GenerateBody):
     """
     Preview a Wikipedia URL by fetching just the title.
     Useful for URL validation before generating quiz.
@@ -54,13 +74,13 @@ def preview_url(body: GenerateBody):
         raise HTTPException(status_code=400, detail="URL must be a Wikipedia article")
     
     try:
-        title, _, _ = scrape_wikipedia(url)
+        title = await fetch_wikipedia_title(url)
         return {
             "url": url,
             "title": title,
             "valid": True
         }
-    except HTTPError as e:
+    except HTTPStatusError as e:
         code = e.response.status_code if e.response is not None else 500
         if code in (403, 429):
             raise HTTPException(
@@ -73,7 +93,7 @@ def preview_url(body: GenerateBody):
 
 
 @app.post("/generate_quiz")
-def generate_quiz_endpoint(body: GenerateBody):
+async def generate_quiz_endpoint(body: GenerateBody, db: Session = Depends(get_db)):
     """
     Generate a quiz from a Wikipedia URL.
     Checks cache first to avoid duplicate scraping.
@@ -83,18 +103,16 @@ def generate_quiz_endpoint(body: GenerateBody):
         raise HTTPException(status_code=400, detail="Invalid URL")
 
     # Check cache first
-    db = SessionLocal()
-    try:
-        cached = check_cache(db, url)
-        if cached:
-            return cached
-    finally:
-        db.close()
+    cached = await run_in_threadpool(check_cache, db, url)
+    if cached:
+        return cached
+    # End the read transaction so the pooled connection isn't held while scraping / calling the LLM
+    await run_in_threadpool(db.rollback)
 
     # Scrape with UA + mobile fallback; surface clean errors for 403/429
     try:
-        title, text, raw_html = scrape_wikipedia(url)
-    except HTTPError as e:
+        title, text = await scrape_wikipedia(url)
+    except HTTPStatusError as e:
         code = e.response.status_code if e.response is not None else 500
         if code in (403, 429):
             raise HTTPException(
@@ -107,79 +125,155 @@ def generate_quiz_endpoint(body: GenerateBody):
         raise HTTPException(status_code=422, detail="Could not extract sufficient article text")
 
     try:
-        result = generate_quiz(url, title, text)
+        result = await run_in_threadpool(generate_quiz, url, title, text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"LLM generation failed: {e}")
 
     # Store in DB
-    db = SessionLocal()
-    try:
-        record = Quiz(
+    return await run_in_threadpool(_store_quiz, db, url, title, text, result)
+
+
+def _store_quiz(db: Session, url: str, title: str, text: str, result: dict) -> dict:
+    """Persist a freshly generated quiz; on a duplicate URL return the stored one instead."""
+    row_id = db.execute(
+        insert_quiz_skip_duplicates()
+        .values(
             url=url,
             title=result.get("title", title),
             scraped_content=text,
-            raw_html=raw_html,  # Store raw HTML for reference
-            full_quiz_data=json.dumps(result, ensure_ascii=False),
+            full_quiz_data=encode_quiz_data(result),
         )
-        db.add(record)
-        db.commit()
-        db.refresh(record)
-        result_with_id = dict(result)
-        result_with_id["id"] = record.id
-        result_with_id["cached"] = False
-        return result_with_id
-    except IntegrityError:
+        .returning(Quiz.id)
+    ).scalar()
+    db.commit()
+    invalidate_cache(url)
+    if row_id is None:
         # URL already exists (race condition), return cached version
-        db.rollback()
         cached = check_cache(db, url)
         if cached:
             return cached
         raise HTTPException(status_code=500, detail="Database error")
-    finally:
-        db.close()
+    result_with_id = dict(result)
+    result_with_id["id"] = row_id
+    result_with_id["cached"] = False
+    return result_with_id
 
 
-@app.get("/history")
-def history():
-    """Get list of all generated quizzes."""
-    db = SessionLocal()
+@app.post("/generate_quiz_batch")
+async def generate_quiz_batch_endpoint(body: BatchBody, db: Session = Depends(get_db)):
+    """
+    Generate quizzes for several Wikipedia URLs with a single LLM call.
+    Cached URLs are served from the database; the rest are scraped concurrently.
+    """
+    urls = list(dict.fromkeys(u.strip() for u in body.urls))
+    for url in urls:
+        if not (url.startswith("http://") or url.startswith("https://")):
+            raise HTTPException(status_code=400, detail=f"Invalid URL: {url}")
+
+    # One query for all cache hits
+    results = await run_in_threadpool(check_cache_many, db, urls)
+    await run_in_threadpool(db.rollback)
+    missing = [u for u in urls if u not in results]
+    if not missing:
+        return [results[u] for u in urls]
+
+    try:
+        scraped = await asyncio.gather(*[scrape_wikipedia(u) for u in missing])
+    except HTTPStatusError as e:
+        code = e.response.status_code if e.response is not None else 500
+        if code in (403, 429):
+            raise HTTPException(
+                status_code=422,
+                detail="Wikipedia blocked the request (403/429). Please retry in a minute or try another page.",
+            )
+        raise
+
+    items = []
+    for url, (title, text) in zip(missing, scraped):
+        if not text or len(text) < 200:
+            raise HTTPException(status_code=422, detail=f"Could not extract sufficient article text from {url}")
+        items.append((url, title, text))
+
     try:
-        rows = db.query(Quiz).order_by(Quiz.date_generated.desc()).all()
-        return [
-            {
-                "id": r.id,
-                "url": r.url,
-                "title": r.title,
-                "date_generated": r.date_generated.isoformat(),
-            }
-            for r in rows
-        ]
-    finally:
-        db.close()
+        quizzes = await run_in_threadpool(generate_quiz_batch, items)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"LLM generation failed: {e}")
+
+    entries = [(url, title, text, quiz) for (url, title, text), quiz in zip(items, quizzes)]
+    results.update(await run_in_threadpool(_store_quizzes, db, entries))
+    return [results[u] for u in urls]
+
+
+def _store_quizzes(db: Session, entries: List[Tuple[str, str, str, dict]]) -> Dict[str, dict]:
+    """Bulk-insert (url, title, text, result) entries and return the response payload per URL."""
+    rows = [
+        {
+            "url": url,
+            "title": result.get("title", title),
+            "scraped_content": text,
+            "full_quiz_data": encode_quiz_data(result),
+        }
+        for url, title, text, result in entries
+    ]
+    inserted = db.execute(insert_quiz_skip_duplicates().returning(Quiz.id, Quiz.url), rows).all()
+    db.commit()
+    for url, _, _, _ in entries:
+        invalidate_cache(url)
+
+    ids = {row.url: row.id for row in inserted}
+    # URLs skipped by ON CONFLICT were stored by another request meanwhile; return those versions
+    skipped = [url for url, _, _, _ in entries if url not in ids]
+    stored = check_cache_many(db, skipped) if skipped else {}
+    for url, _, _, result in entries:
+        if url not in ids:
+            continue
+        result_with_id = dict(result)
+        result_with_id["id"] = ids[url]
+        result_with_id["cached"] = False
+        stored[url] = result_with_id
+    return stored
+
+
+@app.get("/history")
+def history(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """Get a page of generated quizzes, newest first."""
+    rows = db.execute(
+        select(Quiz.id, Quiz.url, Quiz.title, Quiz.date_generated)
+        .order_by(Quiz.date_generated.desc())
+        .limit(limit)
+        .offset(offset)
+    ).all()
+    return [
+        {
+            "id": r.id,
+            "url": r.url,
+            "title": r.title,
+            "date_generated": r.date_generated.isoformat(),
+        }
+        for r in rows
+    ]
 
 
 @app.get("/quiz/{quiz_id}")
-def get_quiz(quiz_id: int):
+def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
     """Get full quiz details by ID."""
-    db = SessionLocal()
-    try:
-        r = db.get(Quiz, quiz_id)
-        if not r:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        data = json.loads(r.full_quiz_data)
-        data["id"] = r.id
-        data["date_generated"] = r.date_generated.isoformat()
-        return data
-    finally:
-        db.close()
+    r = db.execute(
+        select(Quiz.id, Quiz.full_quiz_data, Quiz.date_generated).where(Quiz.id == quiz_id)
+    ).first()
+    if not r:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    data = decode_quiz_data(r.full_quiz_data)
+    data["id"] = r.id
+    data["date_generated"] = r.date_generated.isoformat()
+    return data
 
 
 @app.get("/cache/stats")
-def cache_stats():
+def cache_stats(db: Session = Depends(get_db)):
     """Get cache statistics."""
-    db = SessionLocal()
-    try:
-        return get_cache_stats(db)
-    finally:
-        db.close()
+    return get_cache_stats(db)
 
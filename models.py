@@ -1,21 +1,22 @@
-from pydantic import BaseModel, Field
-from typing import List, Literal
+from typing import Annotated, List, Literal
+
+import msgspec
 
 Difficulty = Literal["easy", "medium", "hard"]
 
-class QuizItem(BaseModel):
+class QuizItem(msgspec.Struct):
     question: str
-    options: List[str] = Field(min_length=4, max_length=4)
+    options: Annotated[List[str], msgspec.Meta(min_length=4, max_length=4)]
     answer: str
     difficulty: Difficulty
     explanation: str
 
-class KeyEntities(BaseModel):
+class KeyEntities(msgspec.Struct):
     people: List[str] = []
     organizations: List[str] = []
     locations: List[str] = []
 
-class QuizOutput(BaseModel):
+class QuizOutput(msgspec.Struct):
     url: str
     title: str
     summary: str
@@ -23,3 +24,6 @@ class QuizOutput(BaseModel):
     sections: List[str]
     quiz: List[QuizItem]
     related_topics: List[str]
+
+class QuizBatchOutput(msgspec.Struct):
+    quizzes: List[QuizOutput]
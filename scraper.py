@@ -1,5 +1,8 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import io
+from urllib.parse import quote, unquote, urlsplit
+import httpx
+from selectolax.lexbor import LexborHTMLParser
 
 DESKTOP_HEADERS = {
     "User-Agent": (
@@ -20,59 +23,109 @@ MOBILE_HEADERS = {
     ),
 }
 
+# Reference junk / infobox / edit markers stripped from the content area. selectolax's lexbor
+# backend has no compiled-selector API, so the best we can do is build the selector string once at import.
+_JUNK_SELECTOR = "sup.reference, table, .mw-references-wrap, span.mw-editsection, div.reflist"
 
-def _fetch(url: str, headers: dict) -> str:
-    resp = requests.get(url, headers=headers, timeout=20, allow_redirects=True)
+# More than the LLM's article budget ever uses, so stop collecting paragraphs past it
+MAX_TEXT_CHARS = 18000
+
+
+# Long-lived clients so TCP/TLS connections to Wikipedia are kept alive and reused
+# (and multiplexed over HTTP/2) across requests, one per User-Agent
+_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+_DESKTOP = httpx.AsyncClient(
+    http2=True, headers=DESKTOP_HEADERS, timeout=20, follow_redirects=True, limits=_LIMITS
+)
+_MOBILE = httpx.AsyncClient(
+    http2=True, headers=MOBILE_HEADERS, timeout=20, follow_redirects=True, limits=_LIMITS
+)
+
+
+async def _fetch(url: str, client: httpx.AsyncClient) -> str:
+    resp = await client.get(url)
     resp.raise_for_status()
     return resp.text
 
 
+async def close_clients() -> None:
+    """Close the pooled HTTP clients; call on application shutdown."""
+    await _DESKTOP.aclose()
+    await _MOBILE.aclose()
+
+
 def _extract(html: str) -> tuple[str, str]:
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
 
     # Title
-    title_el = soup.find("h1", id="firstHeading") or soup.find("h1")
-    title_text = title_el.get_text(strip=True) if title_el else "Untitled"
+    title_el = tree.css_first("h1#firstHeading") or tree.css_first("h1")
+    title_text = title_el.text(strip=True) if title_el else "Untitled"
 
     # Main content area (desktop or mobile)
     content_div = (
-        soup.find(id="mw-content-text")
-        or soup.select_one("div.mw-parser-output")
-        or soup.select_one("section.mw-parser-output")
-        or soup.find("main")
+        tree.css_first("#mw-content-text")
+        or tree.css_first("div.mw-parser-output")
+        or tree.css_first("section.mw-parser-output")
+        or tree.css_first("main")
     )
     if not content_div:
         return title_text, ""
 
     # Strip reference junk / infobox / edit markers
-    for tag in content_div.select(
-        "sup.reference, table, .mw-references-wrap, span.mw-editsection, div.reflist"
-    ):
-        tag.decompose()
+    for node in content_div.css(_JUNK_SELECTOR):
+        node.decompose()
 
-    paragraphs = [p.get_text(" ", strip=True) for p in content_div.find_all("p")]
-    text = "\n\n".join([p for p in paragraphs if p])
-    return title_text, text
+    buf = io.StringIO()
+    for p in content_div.css("p"):
+        paragraph = p.text(separator=" ", strip=True)
+        if not paragraph:
+            continue
+        if buf.tell():
+            buf.write("\n\n")
+        buf.write(paragraph)
+        if buf.tell() > MAX_TEXT_CHARS:
+            break
+    return title_text, buf.getvalue()
 
 
-def scrape_wikipedia(url: str) -> tuple[str, str, str]:
+async def scrape_wikipedia(url: str) -> tuple[str, str]:
     """
     Fetch with a real UA; on 403/429, retry using m.wikipedia.org + mobile UA.
     
     Returns:
-        tuple: (title, extracted_text, raw_html)
+        tuple: (title, extracted_text)
     """
     html = ""
     try:
-        html = _fetch(url, DESKTOP_HEADERS)
-    except requests.HTTPError as e:
+        html = await _fetch(url, _DESKTOP)
+    except httpx.HTTPStatusError as e:
         status = e.response.status_code if e.response is not None else 0
         if status in (403, 429):
             mobile_url = url.replace("https://en.wikipedia.org", "https://m.wikipedia.org")
-            html = _fetch(mobile_url, MOBILE_HEADERS)
+            html = await _fetch(mobile_url, _MOBILE)
         else:
             raise
     
-    title, text = _extract(html)
-    return title, text, html
+    # Parsing is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(_extract, html)
+
+
+
+async def fetch_wikipedia_title(url: str) -> str:
+    """
+    Look up an article title via the Wikipedia REST summary API, which returns a
+    few KB of JSON instead of the full page. Falls back to a full scrape on 404.
+    """
+    parts = urlsplit(url)
+    slug = quote(unquote(parts.path.split("/wiki/", 1)[-1]), safe="")
+    summary_url = f"https://{parts.netloc}/api/rest_v1/page/summary/{slug}"
+    try:
+        resp = await _DESKTOP.get(summary_url, headers={"Accept": "application/json"})
+        resp.raise_for_status()
+        return resp.json()["title"]
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            raise
 
+    title, _ = await scrape_wikipedia(url)
+    return title